@@ -1,40 +1,117 @@
 import os
+import re
+import logging
 import time
-import json
+import orjson
 import asyncio
 from typing import Dict, List, Optional
 from datetime import datetime
 import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
 import google.generativeai as genai
-import httpx
+import aiohttp
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+from prometheus_client import make_asgi_app
 from dotenv import load_dotenv
-from database import db_manager
-
+from logging_config import setup_logging
 
+# Load .env and configure logging before local modules read settings or log
 load_dotenv()
+setup_logging()
+
+from database import db_manager  # noqa: E402
+from cache import response_cache, semantic_cache, make_cache_key  # noqa: E402
+from dispatcher import dispatcher  # noqa: E402
+
+logger = logging.getLogger(__name__)
 
 
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 Z_API_KEY = os.getenv("Z_API_KEY")
 
+# Outbound HTTP pool sizing (tune to expected concurrent /chat load)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "500"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "200"))
+
+# Streaming: flush buffered model deltas once this many characters or seconds accumulate
+STREAM_FLUSH_CHARS = 64
+STREAM_FLUSH_INTERVAL = 0.05
+
 # Initialize Gemini
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
-    print("Gemini Flash initialized")
+    logger.info("Gemini Flash initialized")
 else:
-    print("Gemini API key not found")
+    logger.warning("Gemini API key not found")
+
+# Agent system prompts (sent as a constant system prefix so providers can cache it)
+AGENT_PROMPTS = {
+    "code": "You are a Code Assistant. Provide detailed code analysis and explanations.",
+    "research": "You are a Research Assistant. Provide comprehensive analysis and information.", 
+    "task": "You are a Task Helper. Provide step-by-step guidance."
+}
+
+# Gemini model clients, one per (model, agent) with the agent prompt as system instruction
+GEMINI_MODEL_NAMES = {
+    "gemini-flash": "gemini-1.5-flash",
+    "gemini-flash-8b": "gemini-1.5-flash-8b"
+}
+GEMINI_MODELS = {
+    (model, agent): genai.GenerativeModel(model_name, system_instruction=prompt)
+    for model, model_name in GEMINI_MODEL_NAMES.items()
+    for agent, prompt in AGENT_PROMPTS.items()
+}
+
+def get_gemini_model(model: str, agent: str) -> genai.GenerativeModel:
+    """Get the Gemini client for a model and agent (defaults to gemini-flash / task)"""
+    if model not in GEMINI_MODEL_NAMES:
+        model = "gemini-flash"
+    if agent not in AGENT_PROMPTS:
+        agent = "task"
+    return GEMINI_MODELS[(model, agent)]
+
+def zai_messages(query: str, agent: str) -> List[Dict]:
+    """Build Z.ai chat messages with the agent prompt as the system message"""
+    return [
+        {"role": "system", "content": AGENT_PROMPTS.get(agent, AGENT_PROMPTS["task"])},
+        {"role": "user", "content": query}
+    ]
+
+# Shared HTTP session for outbound LLM calls (reused across requests for keep-alive)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_manager.start_writer()
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=HTTP_MAX_CONNECTIONS,
+            limit_per_host=HTTP_MAX_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        ),
+        timeout=aiohttp.ClientTimeout(connect=5.0, sock_read=30.0)
+    )
+    yield
+    await app.state.http.close()
+    await dispatcher.close()
+    await response_cache.close()
+    await db_manager.stop_writer()
+    db_manager.close()
 
 # FastAPI 
 app = FastAPI(
     title="VM Nebula Task",
     description="Multi-LLM FastAPI backend with intelligent agent routing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -46,6 +123,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics (cache hit/miss counters)
+app.mount("/metrics", make_asgi_app())
+
 # Pydantic models
 class ChatRequest(BaseModel):
     query: str
@@ -60,36 +140,65 @@ class ChatResponse(BaseModel):
     token_count: int
 
 # Agent Detection - Part 2: Agent Specialization
+# Code Assistant 
+CODE_KEYWORDS = frozenset({"code", "function", "debug", "programming", "python", "javascript", 
+                           "error", "bug", "syntax", "algorithm", "script", "class", "method"})
+
+# Research Assistant 
+RESEARCH_KEYWORDS = frozenset({"research", "analyze", "compare", "find", "study", "investigate",
+                               "information", "data", "facts", "explain", "analysis", "summary"})
+
+# Task Helper 
+TASK_KEYWORDS = frozenset({"how to", "steps", "guide", "tutorial", "help", "process", 
+                           "instruction", "walkthrough", "procedure", "setup"})
+
+# Agents in priority order (first matching agent wins)
+AGENT_PRIORITY = {"code": 0, "research": 1, "task": 2}
+
+# Compile all keywords into one Aho-Corasick automaton (single pass per query) when available
+if ahocorasick is not None:
+    AGENT_AUTOMATON = ahocorasick.Automaton()
+    for _agent, _keywords in [("code", CODE_KEYWORDS), ("research", RESEARCH_KEYWORDS), ("task", TASK_KEYWORDS)]:
+        for _keyword in _keywords:
+            AGENT_AUTOMATON.add_word(_keyword, _agent)
+    AGENT_AUTOMATON.make_automaton()
+else:
+    AGENT_AUTOMATON = None
+
+# Fallback without pyahocorasick: one precompiled alternation per agent (same substring matching)
+AGENT_PATTERNS = [
+    (agent, re.compile("|".join(re.escape(keyword) for keyword in sorted(keywords))))
+    for agent, keywords in [("code", CODE_KEYWORDS), ("research", RESEARCH_KEYWORDS), ("task", TASK_KEYWORDS)]
+]
+
 def detect_agent(query: str) -> str:
     """Detect which agent should handle the query based on keywords"""
     query_lower = query.lower()
     
-    # Code Assistant 
-    code_keywords = ["code", "function", "debug", "programming", "python", "javascript", 
-                    "error", "bug", "syntax", "algorithm", "script", "class", "method"]
+    # Substring match via the automaton
+    if AGENT_AUTOMATON is not None:
+        best = "task"
+        for _, agent in AGENT_AUTOMATON.iter(query_lower):
+            if agent == "code":
+                return "code"
+            if AGENT_PRIORITY[agent] < AGENT_PRIORITY[best]:
+                best = agent
+        return best
     
-    # Research Assistant 
-    research_keywords = ["research", "analyze", "compare", "find", "study", "investigate",
-                        "information", "data", "facts", "explain", "analysis", "summary"]
-    
-    # Task Helper 
-    task_keywords = ["how to", "steps", "guide", "tutorial", "help", "process", 
-                    "instruction", "walkthrough", "procedure", "setup"]
-    
-    # Check for matches
-    if any(keyword in query_lower for keyword in code_keywords):
-        return "code"
-    elif any(keyword in query_lower for keyword in research_keywords):
-        return "research"
-    elif any(keyword in query_lower for keyword in task_keywords):
-        return "task"
-    else:
-        return "task"  
+    # Same substring match via regex, checked in priority order
+    for agent, pattern in AGENT_PATTERNS:
+        if pattern.search(query_lower):
+            return agent
+    return "task"
+
+def estimate_tokens(text: str) -> int:
+    """Approximate word/token count without allocating a list of words"""
+    return text.count(" ") + 1 if text else 0
 
 # Model Selection - Part 1: Intelligent Routing
 def choose_model(query: str, agent: str) -> str:
     """Choose best model based on query complexity and cost optimization"""
-    word_count = len(query.split())
+    word_count = estimate_tokens(query)
     
     # Cost optimization logic 
     if word_count < 15:  
@@ -102,22 +211,19 @@ def choose_model(query: str, agent: str) -> str:
         return "gemini-flash"  
 
 # LLM Integration Functions
-async def call_gemini_flash(query: str, model: str) -> Dict:
+async def call_gemini_flash(query: str, model: str, agent: str) -> Dict:
     """Call Google Gemini Flash models"""
     try:
         start_time = time.time()
         
         # Choose the right Gemini model
-        if model == "gemini-flash-8b":
-            model_name = "gemini-1.5-flash-8b"
-        else:
-            model_name = "gemini-1.5-flash"
-        
-        llm = genai.GenerativeModel(model_name)
-        response = llm.generate_content(query)
+        llm = get_gemini_model(model, agent)
+        response = await llm.generate_content_async(query)
         
         processing_time = time.time() - start_time
-        token_count = len(response.text.split())
+        # Prefer provider-reported token usage over estimating from the text
+        usage = getattr(response, "usage_metadata", None)
+        token_count = getattr(usage, "candidates_token_count", 0) or estimate_tokens(response.text)
         
         return {
             "response": response.text,
@@ -128,7 +234,7 @@ async def call_gemini_flash(query: str, model: str) -> Dict:
         }
         
     except Exception as e:
-        print(f"Gemini error: {e}")
+        logger.error("Gemini error: %s", e)
         return {
             "response": f"Gemini error: {str(e)}",
             "confidence": 0.0,
@@ -137,7 +243,7 @@ async def call_gemini_flash(query: str, model: str) -> Dict:
             "success": False
         }
 
-async def call_zai_direct(query: str) -> Dict:
+async def call_zai_direct(query: str, agent: str) -> Dict:
     """Call Z.ai directly (not via OpenRouter)"""
     try:
         start_time = time.time()
@@ -149,22 +255,23 @@ async def call_zai_direct(query: str) -> Dict:
         
         data = {
             "model": "zai-large",
-            "messages": [{"role": "user", "content": query}],
+            "messages": zai_messages(query, agent),
             "max_tokens": 2000
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.z.ai/v1/chat/completions",
-                headers=headers,
-                json=data
-            )
+        async with app.state.http.post(
+            "https://api.z.ai/v1/chat/completions",
+            headers=headers,
+            json=data
+        ) as response:
             response.raise_for_status()
-            result = response.json()
+            result = await response.json()
         
         processing_time = time.time() - start_time
         content = result["choices"][0]["message"]["content"]
-        token_count = result.get("usage", {}).get("total_tokens", len(content.split()))
+        if not isinstance(content, str):
+            raise ValueError(f"Z.ai returned no text content ({type(content).__name__})")
+        token_count = result.get("usage", {}).get("total_tokens") or estimate_tokens(content)
         
         return {
             "response": content,
@@ -175,7 +282,7 @@ async def call_zai_direct(query: str) -> Dict:
         }
         
     except Exception as e:
-        print(f"Z.ai error: {e}")
+        logger.error("Z.ai error: %s", e)
         return {
             "response": f"Z.ai error: {str(e)}",
             "confidence": 0.0,
@@ -184,33 +291,158 @@ async def call_zai_direct(query: str) -> Dict:
             "success": False
         }
 
-# Main LLM Router with Fallback Mechanism
-async def call_llm(model: str, query: str, agent: str) -> Dict:
-    """Route to appropriate LLM with fallback mechanism"""
-    agent_prompts = {
-        "code": "You are a Code Assistant. Provide detailed code analysis and explanations:\n\n",
-        "research": "You are a Research Assistant. Provide comprehensive analysis and information:\n\n", 
-        "task": "You are a Task Helper. Provide step-by-step guidance:\n\n"
+# Streaming LLM Functions (yield text deltas as the model produces them)
+async def stream_gemini_flash(query: str, model: str, agent: str, usage: Dict):
+    """Stream Google Gemini Flash models (token usage is recorded in `usage`)"""
+    llm = get_gemini_model(model, agent)
+    response = await llm.generate_content_async(query, stream=True)
+    async for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+        chunk_usage = getattr(chunk, "usage_metadata", None)
+        if getattr(chunk_usage, "candidates_token_count", 0):
+            usage["token_count"] = chunk_usage.candidates_token_count
+
+async def stream_zai_direct(query: str, agent: str, usage: Dict):
+    """Stream Z.ai directly (OpenAI-compatible SSE, token usage is recorded in `usage`)"""
+    headers = {
+        "Authorization": f"Bearer {Z_API_KEY}",
+        "Content-Type": "application/json"
     }
     
-    full_query = agent_prompts.get(agent, "") + query
+    data = {
+        "model": "zai-large",
+        "messages": zai_messages(query, agent),
+        "max_tokens": 2000,
+        "stream": True
+    }
     
-    # Try primary model
+    async with app.state.http.post(
+        "https://api.z.ai/v1/chat/completions",
+        headers=headers,
+        json=data
+    ) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                break
+            chunk = orjson.loads(payload)
+            if chunk.get("usage"):
+                usage["token_count"] = chunk["usage"].get("total_tokens")
+            choices = chunk.get("choices") or []
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                yield content
+
+# Main LLM Router with Fallback Mechanism
+async def call_llm(model: str, query: str, agent: str) -> Dict:
+    """Route to appropriate LLM with fallback mechanism"""
+    # Try primary model (calls go through the dispatcher for batching and concurrency limits)
     if model.startswith("gemini"):
-        result = await call_gemini_flash(full_query, model)
+        result = await dispatcher.submit(("google", model), call_gemini_flash, query, model, agent)
     elif model == "zai-large":
-        result = await call_zai_direct(full_query)
+        result = await dispatcher.submit(("zai", model), call_zai_direct, query, agent)
     else:
-        result = await call_gemini_flash(full_query, "gemini-flash")
+        result = await dispatcher.submit(("google", "gemini-flash"), call_gemini_flash, query, "gemini-flash", agent)
     
     # Fallback mechanism 
     if not result.get("success", False):
-        print(f"Primary model {model} failed, trying fallback...")
+        logger.warning("Primary model %s failed, trying fallback...", model)
         if model != "gemini-flash":
-            result = await call_gemini_flash(full_query, "gemini-flash")
+            result = await dispatcher.submit(("google", "gemini-flash"), call_gemini_flash, query, "gemini-flash", agent)
         if not result.get("success", False) and Z_API_KEY:
-            result = await call_zai_direct(full_query)
+            result = await dispatcher.submit(("zai", "zai-large"), call_zai_direct, query, agent)
+    
+    return result
+
+async def stream_llm(model: str, query: str, agent: str, result: Dict):
+    """Stream from appropriate LLM with fallback mechanism.
+    
+    Falls back to the next model only if the current one fails before
+    producing any output. Fills `result` with the same fields call_llm returns.
+    """
+    start_time = time.time()
+    
+    candidates = [model]
+    if model != "gemini-flash":
+        candidates.append("gemini-flash")
+    if Z_API_KEY and "zai-large" not in candidates:
+        candidates.append("zai-large")
+    
+    for candidate in candidates:
+        parts = []
+        usage = {}
+        try:
+            if candidate == "zai-large":
+                deltas = stream_zai_direct(query, agent, usage)
+                confidence = 0.85
+            else:
+                deltas = stream_gemini_flash(query, candidate, agent, usage)
+                confidence = 0.9
+            # Streams share the dispatcher's concurrency limit for the whole stream
+            async with dispatcher.semaphore:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            logger.warning("Streaming from %s failed: %s", candidate, e)
+            if parts:
+                raise
+            continue
+        
+        # An empty stream (e.g. Gemini safety block) is a failure, never a cacheable success
+        if not parts:
+            logger.warning("Streaming from %s returned no content", candidate)
+            continue
+        
+        response_text = "".join(parts)
+        result.update({
+            "response": response_text,
+            "confidence": confidence,
+            "processing_time": time.time() - start_time,
+            "token_count": usage.get("token_count") or estimate_tokens(response_text),
+            "success": True
+        })
+        return
+    
+    raise RuntimeError(f"All models failed for {model}")
+
+async def get_cached_response(model: str, query: str, agent: str) -> Optional[Dict]:
+    """Return cached response for a repeated (or, if enabled, paraphrased) query.
+    
+    The returned copy reports the lookup time and no tokens used, and is marked cached so its
+    session row is left out of the model/agent stats.
+    """
+    start_time = time.time()
+    key = make_cache_key(query, model, agent)
+    result = await response_cache.get(key)
     
+    # Near-duplicate (paraphrased) queries, if the semantic cache is enabled
+    if result is None and semantic_cache:
+        result = await semantic_cache.get(query, f"{model}|{agent}")
+        if result is not None:
+            await response_cache.set(key, result)
+    
+    if result is None:
+        return None
+    return {**result, "processing_time": time.time() - start_time, "token_count": 0, "cached": True}
+
+async def cache_response(model: str, query: str, agent: str, result: Dict):
+    """Store response in the exact (and, if enabled, semantic) cache"""
+    await response_cache.set(make_cache_key(query, model, agent), result)
+    if semantic_cache:
+        await semantic_cache.set(query, f"{model}|{agent}", result)
+
+async def get_llm_response(model: str, query: str, agent: str) -> Dict:
+    """Return cached response for repeated queries, otherwise call the LLM"""
+    result = await get_cached_response(model, query, agent)
+    if result is None:
+        result = await call_llm(model, query, agent)
+        await cache_response(model, query, agent, result)
     return result
 
 # API Endpoints
@@ -227,10 +459,10 @@ async def chat_endpoint(request: ChatRequest):
     # Model Selection with Cost Optimization
     model = choose_model(request.query, agent)
     
-    # Call LLM with Fallback
-    result = await call_llm(model, request.query, agent)
+    # Call LLM with Fallback (served from cache for repeated queries)
+    result = await get_llm_response(model, request.query, agent)
     
-    # Save to database
+    # Save to database (queued for the background writer)
     db_manager.save_session(session_id, request.query, result, agent, model)
     
     return ChatResponse(
@@ -265,38 +497,91 @@ async def get_models_status():
         "timestamp": datetime.now().isoformat()
     }
 
+def sse_event(payload: Dict) -> Dict:
+    """Serialize an SSE event with orjson (EventSourceResponse adds the data: framing)"""
+    return {"data": orjson.dumps(payload).decode()}
+
 @app.post("/chat/stream")
 async def stream_chat(request: ChatRequest):
     """Streaming responses using Server-Sent Events"""
     session_id = request.session_id or f"sess_{int(time.time())}_{uuid.uuid4().hex[:8]}"
     
+    # Agent Detection and Model Selection (once per request)
+    agent = detect_agent(request.query)
+    model = choose_model(request.query, agent)
+    
+    async def produce(queue: asyncio.Queue, result: Dict):
+        """Fetch the response (cached or streamed) into the queue; None marks the end"""
+        try:
+            # Serve repeated queries from cache as a single chunk
+            cached = await get_cached_response(model, request.query, agent)
+            if cached is not None:
+                result.update(cached)
+                queue.put_nowait(cached["response"])
+            else:
+                async for delta in stream_llm(model, request.query, agent, result):
+                    queue.put_nowait(delta)
+                await cache_response(model, request.query, agent, result)
+            queue.put_nowait(None)
+        except Exception as e:
+            queue.put_nowait(e)
+    
     async def generate_stream():
+        # Start the upstream call first so its connection setup overlaps the start event
+        queue = asyncio.Queue()
+        result = {}
+        upstream = asyncio.create_task(produce(queue, result))
+        
         try:
             # Send start event
-            yield f"data: {json.dumps({'event': 'start', 'agent': detect_agent(request.query)})}\n\n"
-            
-            # Get response
-            agent = detect_agent(request.query)
-            model = choose_model(request.query, agent)
-            result = await call_llm(model, request.query, agent)
-            
-            # Stream response in chunks
-            response_text = result["response"]
-            words = response_text.split()
+            yield sse_event({'event': 'start', 'agent': agent, 'model': model, 'session_id': session_id})
             
-            for i in range(0, len(words), 5): 
-                chunk = " ".join(words[i:i+5])
-                yield f"data: {json.dumps({'event': 'delta', 'content': chunk})}\n\n"
-                await asyncio.sleep(0.1)  
+            # Relay model output as it arrives, coalescing tiny deltas into larger chunks
+            buffer = []
+            buffered = 0
+            last_flush = time.monotonic()
+            while True:
+                if buffer:
+                    # Flush buffered text after at most STREAM_FLUSH_INTERVAL, even if upstream stalls
+                    remaining = STREAM_FLUSH_INTERVAL - (time.monotonic() - last_flush)
+                    try:
+                        delta = await asyncio.wait_for(queue.get(), max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        yield sse_event({'event': 'delta', 'content': ''.join(buffer)})
+                        buffer = []
+                        buffered = 0
+                        last_flush = time.monotonic()
+                        continue
+                else:
+                    delta = await queue.get()
+                if delta is None:
+                    break
+                if isinstance(delta, Exception):
+                    # Deliver text received before the failure, then report the error
+                    if buffer:
+                        yield sse_event({'event': 'delta', 'content': ''.join(buffer)})
+                    raise delta
+                buffer.append(delta)
+                buffered += len(delta)
+                if buffered >= STREAM_FLUSH_CHARS or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield sse_event({'event': 'delta', 'content': ''.join(buffer)})
+                    buffer = []
+                    buffered = 0
+                    last_flush = time.monotonic()
+            if buffer:
+                yield sse_event({'event': 'delta', 'content': ''.join(buffer)})
             
             # Send completion 
-            yield f"data: {json.dumps({'event': 'complete', 'model': model, 'confidence': result['confidence']})}\n\n"
+            yield sse_event({'event': 'complete', 'model': model, 'confidence': result['confidence']})
             
-            # Save session
+            # Save session (queued for the background writer)
             db_manager.save_session(session_id, request.query, result, agent, model)
             
         except Exception as e:
-            yield f"data: {json.dumps({'event': 'error', 'message': str(e)})}\n\n"
+            yield sse_event({'event': 'error', 'message': str(e)})
+        finally:
+            # Client disconnected or stream failed: stop the upstream call
+            upstream.cancel()
     
     return EventSourceResponse(generate_stream())
 
@@ -310,30 +595,31 @@ async def health_check():
         "models_available": available_keys
     }
 
+# Database reads run in a worker thread so waiting on the writer's lock or disk IO never blocks the event loop
 @app.get("/sessions/recent")
 async def get_recent_sessions(limit: int = 20):
     """Get recent chat sessions"""
-    return db_manager.get_recent_sessions(limit)
+    return await asyncio.to_thread(db_manager.get_recent_sessions, limit)
 
 @app.get("/sessions/{session_id}/history")
 async def get_session_history(session_id: str, limit: int = 10):
     """Get chat history for a specific session"""
-    return db_manager.get_session_history(session_id, limit)
+    return await asyncio.to_thread(db_manager.get_session_history, session_id, limit)
 
 @app.get("/stats/models")
 async def get_model_stats():
     """Get usage statistics for different models"""
-    return db_manager.get_model_stats()
+    return await asyncio.to_thread(db_manager.get_model_stats)
 
 @app.get("/stats/agents")
 async def get_agent_stats():
     """Get usage statistics for different agents"""
-    return db_manager.get_agent_stats()
+    return await asyncio.to_thread(db_manager.get_agent_stats)
 
 @app.delete("/sessions/cleanup")
 async def cleanup_old_sessions(days: int = 30):
     """Clean up sessions older than specified days"""
-    deleted_count = db_manager.cleanup_old_sessions(days)
+    deleted_count = await asyncio.to_thread(db_manager.cleanup_old_sessions, days)
     return {"deleted_sessions": deleted_count, "days": days}
 
 # Run the application
@@ -341,4 +627,16 @@ if __name__ == "__main__":
     import uvicorn
     print("Starting Smart AI Assistant...")
     print("API Documentation: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Caches, /metrics counters and MAX_CONCURRENCY are per process, so default to one worker
+    workers = int(os.getenv("WORKERS", "1"))
+    # "auto" picks uvloop and httptools when installed (uvicorn[standard] on Linux/macOS)
+    uvicorn.run(
+        # Multiple workers need an import string; a single worker reuses this already-loaded app
+        "app:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=workers,
+        log_level="warning"
+    )
\ No newline at end of file
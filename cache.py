@@ -0,0 +1,223 @@
+import os
+import logging
+import re
+import orjson
+import hashlib
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Optional
+from cachetools import LRUCache, TTLCache
+from prometheus_client import Counter
+
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "10000"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Semantic (embedding) cache for near-duplicate queries
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "50000"))
+# Fraction of the oldest entries dropped at once when full (removing from a flat index rebuilds it)
+SEMANTIC_CACHE_EVICT_FRACTION = 0.1
+# Recent query embeddings kept so a miss's lookup vector is reused when its response is stored
+EMBEDDING_CACHE_SIZE = 1024
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+cache_hits = Counter("llm_cache_hits_total", "LLM response cache hits")
+cache_misses = Counter("llm_cache_misses_total", "LLM response cache misses")
+semantic_cache_hits = Counter("llm_semantic_cache_hits_total", "LLM semantic cache hits")
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivial variations share a key"""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+def make_cache_key(query: str, model: str, agent: str) -> str:
+    """Build cache key from model, agent and normalized query"""
+    return hashlib.sha256(f"{model}|{agent}|{normalize_query(query)}".encode()).hexdigest()
+
+class MemoryCache:
+    """In-process TTL cache (used for development / single worker)"""
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: int = CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Dict]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Dict):
+        self._cache[key] = value
+
+    async def close(self):
+        self._cache.clear()
+
+class RedisCache:
+    """Redis-backed cache shared across workers (used when REDIS_URL is set)"""
+
+    def __init__(self, url: str, ttl: int = CACHE_TTL):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Dict]:
+        value = await self._redis.get(f"llm:{key}")
+        return orjson.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Dict):
+        await self._redis.set(f"llm:{key}", orjson.dumps(value), ex=self.ttl)
+
+    async def close(self):
+        await self._redis.aclose()
+
+class ResponseCache:
+    """Cache for LLM responses that records hit/miss metrics"""
+
+    def __init__(self):
+        self.backend = RedisCache(REDIS_URL) if REDIS_URL else MemoryCache()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Get cached response, or None on miss (backend errors count as misses)"""
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning("Cache get error: %s", e)
+            value = None
+
+        if value is None:
+            cache_misses.inc()
+        else:
+            cache_hits.inc()
+        return value
+
+    async def set(self, key: str, value: Dict):
+        """Store a successful response"""
+        if value.get("success") is False:
+            return
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            logger.warning("Cache set error: %s", e)
+
+    async def close(self):
+        await self.backend.close()
+
+class SemanticCache:
+    """In-process embedding cache that matches paraphrased queries.
+
+    Entries are partitioned by namespace (model|agent), so a response is only
+    reused for the same model and agent and changing models never serves
+    stale answers. Once capacity is reached the oldest entries are evicted in
+    bulk, so the index rebuild is paid once per batch rather than per insert.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_CAPACITY, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        import faiss
+        import numpy as np
+        from sentence_transformers import SentenceTransformer
+
+        self._faiss = faiss
+        self._np = np
+        self._encoder = SentenceTransformer(EMBEDDING_MODEL, backend="onnx", device="cpu")
+        self.dimension = self._encoder.get_sentence_embedding_dimension()
+        self.capacity = capacity
+        self.threshold = threshold
+        self._indexes: Dict[str, object] = {}
+        self._responses: Dict[int, Dict] = {}
+        self._order = deque()
+        self._next_id = 0
+        self._embeddings = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+        self._lock = threading.Lock()
+
+    def _embed(self, query: str):
+        # Normalized float32 embeddings, so inner product == cosine similarity
+        text = normalize_query(query)
+        with self._lock:
+            embedding = self._embeddings.get(text)
+        if embedding is None:
+            embedding = self._encoder.encode(
+                [text], normalize_embeddings=True, convert_to_numpy=True
+            ).astype("float32")
+            with self._lock:
+                self._embeddings[text] = embedding
+        return embedding
+
+    def _lookup(self, query: str, namespace: str) -> Optional[Dict]:
+        embedding = self._embed(query)
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None or index.ntotal == 0:
+                return None
+            scores, ids = index.search(embedding, 1)
+            if ids[0][0] == -1 or scores[0][0] < self.threshold:
+                return None
+            return self._responses.get(int(ids[0][0]))
+
+    def _store(self, query: str, namespace: str, value: Dict):
+        np = self._np
+        embedding = self._embed(query)
+        with self._lock:
+            if len(self._order) >= self.capacity:
+                self._evict()
+
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(self.dimension))
+                self._indexes[namespace] = index
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(embedding, np.array([entry_id], dtype="int64"))
+            self._responses[entry_id] = value
+            self._order.append((namespace, entry_id))
+
+    def _evict(self):
+        # Drop the oldest entries, one remove_ids call per namespace (caller holds the lock)
+        count = max(1, int(self.capacity * SEMANTIC_CACHE_EVICT_FRACTION))
+        evicted: Dict[str, list] = {}
+        for _ in range(min(count, len(self._order))):
+            namespace, entry_id = self._order.popleft()
+            evicted.setdefault(namespace, []).append(entry_id)
+            self._responses.pop(entry_id, None)
+        for namespace, ids in evicted.items():
+            self._indexes[namespace].remove_ids(self._np.array(ids, dtype="int64"))
+
+    async def get(self, query: str, namespace: str) -> Optional[Dict]:
+        """Get response for the most similar cached query above the threshold"""
+        try:
+            value = await asyncio.to_thread(self._lookup, query, namespace)
+        except Exception as e:
+            logger.warning("Semantic cache get error: %s", e)
+            return None
+
+        if value is not None:
+            semantic_cache_hits.inc()
+        return value
+
+    async def set(self, query: str, namespace: str, value: Dict):
+        """Store a successful response"""
+        if value.get("success") is False:
+            return
+        try:
+            await asyncio.to_thread(self._store, query, namespace, value)
+        except Exception as e:
+            logger.warning("Semantic cache set error: %s", e)
+
+def create_semantic_cache() -> Optional[SemanticCache]:
+    """Create semantic cache if enabled; disabled with a warning if it can't be loaded"""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        return SemanticCache()
+    except ImportError as e:
+        logger.warning("Semantic cache disabled (missing dependency): %s", e)
+    except Exception as e:
+        # e.g. embedding model download or ONNX load failure
+        logger.warning("Semantic cache disabled (failed to load %s): %s", EMBEDDING_MODEL, e)
+    return None
+
+# Create cache instances
+response_cache = ResponseCache()
+semantic_cache = create_semantic_cache()
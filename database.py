@@ -1,62 +1,106 @@
 import sqlite3
-import os
-from typing import Dict, List
+import logging
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+# Background writer batching (rows per transaction / max wait for a batch to fill)
+WRITE_BATCH_SIZE = 256
+WRITE_BATCH_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+# Schema migrations (lists of statements), applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    # 1: indexes for history, recent-session, stats and cleanup queries
+    [
+        'CREATE INDEX IF NOT EXISTS idx_sessions_session_id ON sessions(session_id)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions(timestamp DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_model ON sessions(model)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_agent ON sessions(agent_used)',
+    ],
+    # 2: mark responses served from cache so stats only count real LLM calls
+    [
+        'ALTER TABLE sessions ADD COLUMN cached INTEGER NOT NULL DEFAULT 0',
+    ],
+]
+
+INSERT_SESSION_SQL = '''
+    INSERT INTO sessions 
+    (session_id, query, response, agent_used, model, confidence, processing_time, token_count, cached)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
 
 class DatabaseManager:
     """Simple database manager for storing chat sessions"""
     
     def __init__(self):
         self.db_path = "sessions.db"
-        self.setup_database()
-    
-    def setup_database(self):
-        """Create database and table if they don't exist"""
-        # Delete old database if it exists (to fix schema issues)
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
-            print("Old database removed")
-        
-        # Create new database with correct structure
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
-        # Create sessions table
-        cursor.execute('''
-            CREATE TABLE sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                query TEXT NOT NULL,
-                response TEXT NOT NULL,
-                agent_used TEXT NOT NULL,
-                model TEXT NOT NULL,
-                confidence REAL NOT NULL,
-                processing_time REAL NOT NULL,
-                token_count INTEGER NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
+        # Single shared connection (autocommit); SQLite needs writes serialized by the app
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-65536;
         ''')
         
-        conn.commit()
-        conn.close()
-        print("Database created successfully")
+        self.setup_database()
+        self.migrate()
+        
+        # Queued session writes, drained by the background writer while it runs
+        self._write_q: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def setup_database(self):
+        """Create table if it doesn't exist"""
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    agent_used TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    processing_time REAL NOT NULL,
+                    token_count INTEGER NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+    
+    def migrate(self):
+        """Apply pending schema migrations (tracked with PRAGMA user_version).
+        
+        Each step re-reads the version inside its own BEGIN IMMEDIATE transaction, so
+        workers starting together never apply the same step twice.
+        """
+        with self._lock:
+            for target, statements in enumerate(MIGRATIONS, start=1):
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+                    if version >= target:
+                        self._conn.execute('COMMIT')
+                        continue
+                    for statement in statements:
+                        self._conn.execute(statement)
+                    self._conn.execute(f'PRAGMA user_version = {target}')
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                logger.info("Database migrated to version %d", target)
     
     def save_session(self, session_id: str, query: str, response_data: Dict, agent: str, model: str) -> bool:
-        """Save chat session to database"""
+        """Save chat session to database (queued for the background writer when it is running)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO sessions 
-                (session_id, query, response, agent_used, model, confidence, processing_time, token_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            row = (
                 session_id,
                 query,
                 response_data["response"],
@@ -64,144 +108,209 @@ class DatabaseManager:
                 model,
                 response_data["confidence"],
                 response_data["processing_time"],
-                response_data["token_count"]
-            ))
+                response_data["token_count"],
+                int(response_data.get("cached", False))
+            )
             
-            conn.commit()
-            conn.close()
-            print(f"Session saved: {session_id}")
+            if self._write_q is not None:
+                self._write_q.put_nowait(row)
+            elif self._write_batch([row]):
+                logger.debug("Session saved: %s", session_id)
+            else:
+                return False
             return True
         except Exception as e:
-            print(f"Error saving session: {e}")
+            logger.error("Error saving session: %s", e)
             return False
     
+    def _write_batch(self, rows: List[tuple]) -> int:
+        """Insert rows in a single transaction (one fsync per batch); returns rows saved.
+        
+        If the batch fails, rows are retried one at a time so a bad row only loses itself.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(INSERT_SESSION_SQL, rows)
+                self._conn.execute('COMMIT')
+                return len(rows)
+            except Exception as e:
+                self._conn.execute('ROLLBACK')
+                if len(rows) == 1:
+                    logger.error("Error saving session %s: %s", rows[0][0], e)
+                    return 0
+            
+            saved = 0
+            for row in rows:
+                try:
+                    self._conn.execute(INSERT_SESSION_SQL, row)
+                    saved += 1
+                except Exception as e:
+                    logger.error("Error saving session %s: %s", row[0], e)
+            return saved
+    
+    async def _run_writer(self):
+        """Drain queued writes in batches of up to WRITE_BATCH_SIZE rows or WRITE_BATCH_INTERVAL seconds"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            row = await self._write_q.get()
+            if row is None:
+                break
+            
+            batch = [row]
+            deadline = loop.time() + WRITE_BATCH_INTERVAL
+            while len(batch) < WRITE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._write_q.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            
+            try:
+                saved = await asyncio.to_thread(self._write_batch, batch)
+                logger.debug("Sessions saved: %d of %d", saved, len(batch))
+            except Exception as e:
+                logger.error("Error saving sessions: %s", e)
+    
+    def start_writer(self):
+        """Start the background writer (call from within the running event loop)"""
+        self._write_q = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._run_writer())
+    
+    async def stop_writer(self):
+        """Flush pending writes and stop the background writer"""
+        if self._writer_task is None:
+            return
+        self._write_q.put_nowait(None)
+        await self._writer_task
+        self._write_q = None
+        self._writer_task = None
+    
     def get_session_history(self, session_id: str, limit: int = 10) -> List[Dict]:
         """Get chat history for a specific session"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM sessions 
-                WHERE session_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (session_id, limit))
-            
-            rows = cursor.fetchall()
-            result = [dict(row) for row in rows]
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT * FROM sessions 
+                    WHERE session_id = ? 
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                ''', (session_id, limit)).fetchall()
             
-            conn.close()
-            return result
+            return [dict(row) for row in rows]
         except Exception as e:
-            print(f"Error getting history: {e}")
+            logger.error("Error getting history: %s", e)
             return []
     
     def get_recent_sessions(self, limit: int = 20) -> List[Dict]:
         """Get recent chat sessions"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT DISTINCT session_id, MAX(timestamp) as last_activity, 
+                           COUNT(*) as message_count
+                    FROM sessions 
+                    GROUP BY session_id 
+                    ORDER BY last_activity DESC 
+                    LIMIT ?
+                ''', (limit,)).fetchall()
             
-            cursor.execute('''
-                SELECT DISTINCT session_id, MAX(timestamp) as last_activity, 
-                       COUNT(*) as message_count
-                FROM sessions 
-                GROUP BY session_id 
-                ORDER BY last_activity DESC 
-                LIMIT ?
-            ''', (limit,))
-            
-            rows = cursor.fetchall()
-            result = [dict(row) for row in rows]
-            
-            conn.close()
-            return result
+            return [dict(row) for row in rows]
         except Exception as e:
-            print(f"Error getting recent sessions: {e}")
+            logger.error("Error getting recent sessions: %s", e)
             return []
     
     def get_model_stats(self) -> Dict:
-        """Get usage statistics for different models"""
+        """Get usage statistics for different models (real LLM calls only, cache hits excluded)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT model, 
-                       COUNT(*) as usage_count,
-                       AVG(processing_time) as avg_processing_time,
-                       AVG(confidence) as avg_confidence,
-                       SUM(token_count) as total_tokens
-                FROM sessions 
-                GROUP BY model
-            ''')
-            
-            rows = cursor.fetchall()
-            result = {row['model']: dict(row) for row in rows}
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT model, 
+                           COUNT(*) as usage_count,
+                           AVG(processing_time) as avg_processing_time,
+                           AVG(confidence) as avg_confidence,
+                           SUM(token_count) as total_tokens
+                    FROM sessions 
+                    WHERE cached = 0
+                    GROUP BY model
+                ''').fetchall()
             
-            conn.close()
-            return result
+            return {row['model']: dict(row) for row in rows}
         except Exception as e:
-            print(f"Error getting model stats: {e}")
+            logger.error("Error getting model stats: %s", e)
             return {}
     
     def get_agent_stats(self) -> Dict:
-        """Get usage statistics for different agents"""
+        """Get usage statistics for different agents (real LLM calls only, cache hits excluded)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT agent_used, 
+                           COUNT(*) as usage_count,
+                           AVG(processing_time) as avg_processing_time,
+                           AVG(confidence) as avg_confidence
+                    FROM sessions 
+                    WHERE cached = 0
+                    GROUP BY agent_used
+                ''').fetchall()
             
-            cursor.execute('''
-                SELECT agent_used, 
-                       COUNT(*) as usage_count,
-                       AVG(processing_time) as avg_processing_time,
-                       AVG(confidence) as avg_confidence
-                FROM sessions 
-                GROUP BY agent_used
-            ''')
-            
-            rows = cursor.fetchall()
-            result = {row['agent_used']: dict(row) for row in rows}
-            
-            conn.close()
-            return result
+            return {row['agent_used']: dict(row) for row in rows}
         except Exception as e:
-            print(f"Error getting agent stats: {e}")
+            logger.error("Error getting agent stats: %s", e)
             return {}
     
     def clear_all_sessions(self):
         """Delete all sessions from database"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._lock:
+                self._conn.execute('DELETE FROM sessions')
             
-            cursor.execute('DELETE FROM sessions')
-            conn.commit()
-            conn.close()
-            
-            print("All sessions deleted")
+            logger.info("All sessions deleted")
             return True
         except Exception as e:
-            print(f"Error clearing sessions: {e}")
+            logger.error("Error clearing sessions: %s", e)
             return False
     
+    def cleanup_old_sessions(self, days: int = 30) -> int:
+        """Delete sessions older than the given number of days"""
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "DELETE FROM sessions WHERE timestamp < datetime('now', ?)",
+                    (f"-{days} days",)
+                )
+            
+            logger.info("Old sessions deleted: %d", cursor.rowcount)
+            return cursor.rowcount
+        except Exception as e:
+            logger.error("Error cleaning up sessions: %s", e)
+            return 0
+    
     def count_sessions(self) -> int:
         """Count total sessions in database"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._lock:
+                count = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM sessions')
-            count = cursor.fetchone()[0]
-            
-            conn.close()
             return count
         except Exception as e:
-            print(f"Error counting sessions: {e}")
+            logger.error("Error counting sessions: %s", e)
             return 0
+    
+    def close(self):
+        """Close the shared database connection"""
+        with self._lock:
+            self._conn.close()
 
 # Create database manager instance
 db_manager = DatabaseManager()
 
-print(f"Database ready! Sessions will be stored in: {db_manager.db_path}")
\ No newline at end of file
+logger.info("Database ready! Sessions will be stored in: %s", db_manager.db_path)
\ No newline at end of file
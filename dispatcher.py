@@ -0,0 +1,89 @@
+import os
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "64"))
+# Neither provider has a synchronous batch endpoint, so waiting to collect calls only adds latency
+BATCH_WINDOW_MS = int(os.getenv("BATCH_WINDOW_MS", "0"))
+
+class BatchingDispatcher:
+    """Central dispatcher for outbound LLM calls.
+
+    Calls are queued per (provider, model). A consumer per queue fires
+    whatever has queued up concurrently, optionally waiting up to the batch
+    window (off by default) for more calls to arrive first. All calls share one semaphore, so no more than
+    MAX_CONCURRENCY requests are in flight against the providers at once.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, batch_window_ms: int = BATCH_WINDOW_MS):
+        self.max_concurrency = max_concurrency
+        self.batch_window = batch_window_ms / 1000
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[Tuple[str, str], asyncio.Queue] = {}
+        self._consumers: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._batches = set()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit shared by all outbound calls (created in the running loop)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def submit(self, key: Tuple[str, str], func: Callable[..., Awaitable[Dict]], *args) -> Dict:
+        """Queue a call for (provider, model) and wait for its result"""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            self._consumers[key] = asyncio.create_task(self._consume(queue))
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((func, args, future))
+        return await future
+
+    async def _consume(self, queue: asyncio.Queue):
+        """Collect calls arriving within the batch window and dispatch them together"""
+        while True:
+            batch = [await queue.get()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        await asyncio.gather(*(self._run(func, args, future) for func, args, future in batch))
+
+    async def _run(self, func: Callable[..., Awaitable[Dict]], args: tuple, future: asyncio.Future):
+        # Skip calls whose caller has already gone away (e.g. client disconnected)
+        if future.done():
+            return
+        try:
+            async with self.semaphore:
+                result = await func(*args)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            # Dispatcher shutting down: don't leave the caller waiting
+            if not future.done():
+                future.cancel()
+
+    async def close(self):
+        """Stop consumers and cancel in-flight batches"""
+        tasks = list(self._consumers.values()) + list(self._batches)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues.clear()
+        self._consumers.clear()
+        self._semaphore = None
+
+# Create dispatcher instance
+dispatcher = BatchingDispatcher()
@@ -0,0 +1,25 @@
+import os
+import queue
+import atexit
+import logging
+import logging.handlers
+
+_listener = None
+
+def setup_logging():
+    """Configure root logger to enqueue records; a background thread writes them to stderr"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))